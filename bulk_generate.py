@@ -5,133 +5,286 @@ Generates multiple t-shirt designs with configurable parameters
 """
 
 import argparse
+import random
+import sys
 import time
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from generate_tee import generate_design, upload_to_printful, create_shopify_product, DESIGN_CATEGORIES
+from generate_tee import (
+    generate_design, generate_design_prompt, themes_from_today, prompt_hash, upload_to_printful,
+    design_saved, create_shopify_products, append_log, json_line, get_openai_client, get_session,
+    preflight, CATEGORY_NAMES, DESIGN_CATEGORIES
+)
 
-def bulk_generate(category=None, count=1, delay=5):
-    """Generate multiple designs with delay between each"""
+# Number of designs sent to Shopify per GraphQL request
+SHOPIFY_BATCH_SIZE = 10
+
+BANNER = "=" * 40
+
+class StartLimiter:
+    """Space out design starts across worker threads"""
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_start = time.monotonic()
+        self.lock = threading.Lock()
+        
+    def wait(self):
+        """Block until this worker is allowed to start its next design"""
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+        
+        if start > now:
+            time.sleep(start - now)
+
+class PromptRegistry:
+    """Track the prompts used in a bulk session so DALL-E is never paid twice for one"""
+    def __init__(self):
+        self.seen = {}
+        self.lock = threading.Lock()
+        
+    def claim(self, index, category=None):
+        """Reserve a prompt for a design, taking the next unused theme in today's rotation
+        
+        Returns (category, theme, duplicate_of), where duplicate_of is the
+        index of the earlier design with the same prompt, or None.
+        """
+        category = category or random.choice(CATEGORY_NAMES)
+        category_info = DESIGN_CATEGORIES.get(category, DESIGN_CATEGORIES["abstract"])
+        themes = themes_from_today(category_info)
+        
+        with self.lock:
+            for theme in themes:
+                key = prompt_hash(generate_design_prompt(category, theme, category_info["style"]))
+                if key not in self.seen:
+                    self.seen[key] = index
+                    return category, theme, None
+            
+            # Every theme in the category has been used this session
+            key = prompt_hash(generate_design_prompt(category, themes[0], category_info["style"]))
+            return category, themes[0], self.seen[key]
+
+def generate_one(index, count, category, limiter, openai_client, session, registry):
+    """Generate, upload and record a single design"""
+    
+    limiter.wait()
+    timestamp = datetime.now().isoformat(timespec='seconds')
+    print(f"\nGenerating design {index + 1} of {count}...")
     
-    print(f"=== Bulk T-Shirt Design Generation ===")
-    print(f"Category: {category or 'Random'}")
-    print(f"Count: {count}")
-    print(f"Delay: {delay} seconds")
-    print("=" * 40)
+    category, theme, duplicate_of = registry.claim(index + 1, category)
+    if duplicate_of is not None:
+        print(f"↺ Design {index + 1} repeats the prompt of design {duplicate_of}, skipping")
+        return {
+            "index": index + 1,
+            "timestamp": timestamp,
+            "status": "duplicate",
+            "dedup": True,
+            "duplicate_of": duplicate_of,
+            "design": {
+                "category": category,
+                "theme": theme
+            }
+        }
+    
+    try:
+        # Generate design
+        design = generate_design(category, theme=theme, openai_client=openai_client, session=session)
+        
+        if design:
+            # Upload to Printful (Shopify products are created in batches later)
+            printful_id = upload_to_printful(design, session=session)
+            
+            print(f"✓ Design {index + 1} generated successfully!")
+            
+            # Record result
+            return {
+                "index": index + 1,
+                "timestamp": timestamp,
+                "status": "success",
+                "design": {
+                    "filename": design["filename"] if design_saved(design) else None,
+                    "category": design["category"],
+                    "theme": design["theme"]
+                },
+                "printful_product_id": printful_id,
+                "shopify_product_id": None
+            }
+            
+        print(f"✗ Design {index + 1} failed to generate")
+        return {
+            "index": index + 1,
+            "timestamp": timestamp,
+            "status": "failed",
+            "error": "Design generation failed"
+        }
+            
+    except Exception as e:
+        print(f"✗ Design {index + 1} error: {str(e)}")
+        return {
+            "index": index + 1,
+            "timestamp": timestamp,
+            "status": "error",
+            "error": str(e)
+        }
+
+def record_result(session_log, result, bulk_session):
+    """Stream a finished result to the session log and, on success, the main log"""
+    session_log.write(json_line(result))
+    session_log.flush()
+    
+    if result["status"] == "success":
+        append_log([{
+            "timestamp": result["timestamp"],
+            "design": result["design"],
+            "printful_product_id": result.get("printful_product_id"),
+            "shopify_product_id": result.get("shopify_product_id"),
+            "bulk_session": bulk_session
+        }])
+
+def flush_to_shopify(pending, session, session_log, bulk_session):
+    """Create Shopify products for buffered results in one request and record them"""
+    if not pending:
+        return
     
-    results = []
+    batch = pending[:]
+    pending.clear()
+    shopify_ids = [None] * len(batch)
+    
+    try:
+        shopify_ids = create_shopify_products([result["design"] for result in batch], session=session)
+    finally:
+        # The designs already exist in Printful, so log them even if Shopify was interrupted
+        for result, shopify_id in zip(batch, shopify_ids):
+            result["shopify_product_id"] = shopify_id
+            record_result(session_log, result, bulk_session)
+
+def bulk_generate(category=None, count=1, delay=0, concurrency=3):
+    """Generate multiple designs concurrently, starting one every `delay` seconds"""
+    
+    print("\n".join([
+        "=== Bulk T-Shirt Design Generation ===",
+        f"Category: {category or 'Random'}",
+        f"Count: {count}",
+        f"Delay: {delay} seconds",
+        f"Concurrency: {concurrency}",
+        BANNER,
+    ]))
+    
+    start_time = datetime.now()
+    limiter = StartLimiter(delay)
+    
+    # Clients are created once and shared by every design in the session
+    openai_client = get_openai_client()
+    session = get_session()
+    filename = f"bulk_generation_{start_time:%Y%m%d_%H%M%S}.jsonl"
+    registry = PromptRegistry()
     successful = 0
+    skipped = 0
     failed = 0
     
-    for i in range(count):
-        print(f"\nGenerating design {i + 1} of {count}...")
+    # Each design is network-bound (DALL-E, Printful, Shopify), so overlap them.
+    # Results are streamed to the session log as they finish, so an interrupted
+    # run still leaves a readable partial log.
+    with open(filename, 'wb', buffering=1 << 16) as session_log, \
+            ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = [
+            executor.submit(generate_one, i, count, category, limiter, openai_client, session, registry)
+            for i in range(count)
+        ]
+        
+        # Successful designs waiting for their Shopify product, and the
+        # futures whose results have already been handled
+        pending = []
+        collected = set()
+        
+        # Duplicate rows are recorded last, once the design they repeat has its ids
+        successes = {}
+        duplicates = []
         
         try:
-            # Generate design
-            design = generate_design(category)
-            
-            if design:
-                # Upload to Printful
-                printful_id = upload_to_printful(design)
+            for future in as_completed(futures):
+                collected.add(future)
+                result = future.result()
                 
-                # Create Shopify product
-                shopify_id = create_shopify_product(design, printful_id)
+                if result["status"] == "duplicate":
+                    skipped += 1
+                    duplicates.append(result)
+                    continue
                 
-                # Record result
-                result = {
-                    "index": i + 1,
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "success",
-                    "design": {
-                        "filename": design["filename"],
-                        "category": design["category"],
-                        "theme": design["theme"]
-                    },
-                    "printful_product_id": printful_id,
-                    "shopify_product_id": shopify_id
-                }
+                if result["status"] != "success":
+                    failed += 1
+                    record_result(session_log, result, filename)
+                    continue
                 
-                results.append(result)
                 successful += 1
-                print(f"✓ Design {i + 1} generated successfully!")
-                
-            else:
-                results.append({
-                    "index": i + 1,
-                    "timestamp": datetime.now().isoformat(),
-                    "status": "failed",
-                    "error": "Design generation failed"
-                })
-                failed += 1
-                print(f"✗ Design {i + 1} failed to generate")
+                successes[result["index"]] = result
+                pending.append(result)
                 
-        except Exception as e:
-            results.append({
-                "index": i + 1,
-                "timestamp": datetime.now().isoformat(),
-                "status": "error",
-                "error": str(e)
-            })
-            failed += 1
-            print(f"✗ Design {i + 1} error: {str(e)}")
-        
-        # Delay between generations (except for the last one)
-        if i < count - 1:
-            print(f"Waiting {delay} seconds before next generation...")
-            time.sleep(delay)
+                if len(pending) >= SHOPIFY_BATCH_SIZE:
+                    flush_to_shopify(pending, session, session_log, filename)
+        except BaseException:
+            # On Ctrl-C or an error, don't start (and pay for) the designs still queued
+            executor.shutdown(wait=True, cancel_futures=True)
+            
+            # Designs that were in flight have reached Printful; keep them for the log
+            for future in futures:
+                if future in collected or future.cancelled() or future.exception() is not None:
+                    continue
+                result = future.result()
+                if result["status"] == "success":
+                    successes[result["index"]] = result
+                    pending.append(result)
+            raise
+        finally:
+            # Record the last partial batch, even when the run was cut short
+            flush_to_shopify(pending, session, session_log, filename)
+            
+            # A duplicate points at the products made for the design it repeats
+            for result in duplicates:
+                original = successes.get(result["duplicate_of"], {})
+                result["printful_product_id"] = original.get("printful_product_id")
+                result["shopify_product_id"] = original.get("shopify_product_id")
+                record_result(session_log, result, filename)
     
     # Summary
-    print("\n" + "=" * 40)
-    print(f"BULK GENERATION COMPLETE")
-    print(f"Successful: {successful}")
-    print(f"Failed: {failed}")
-    print(f"Total: {count}")
-    print("=" * 40)
-    
-    # Save bulk results
-    bulk_log = {
-        "session": {
-            "start_time": results[0]["timestamp"] if results else datetime.now().isoformat(),
-            "end_time": datetime.now().isoformat(),
-            "category": category or "random",
-            "requested_count": count,
-            "successful_count": successful,
-            "failed_count": failed
-        },
-        "results": results
-    }
+    lines = [
+        f"\n{BANNER}",
+        "BULK GENERATION COMPLETE",
+        f"Successful: {successful}",
+        f"Skipped (duplicate prompt): {skipped}",
+        f"Failed: {failed}",
+        f"Total: {count}",
+    ]
+    themes = len(DESIGN_CATEGORIES.get(category, DESIGN_CATEGORIES["abstract"])["themes"])
+    if category and count > themes:
+        lines.append(f"Note: '{category}' has {themes} themes, so one run makes at most {themes} unique designs")
+    if skipped:
+        lines.append("Skipped designs reuse the product ids of the design they repeat")
+    lines.append(BANNER)
+    print("\n".join(lines))
     
-    filename = f"bulk_generation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(filename, 'w') as f:
-        json.dump(bulk_log, f, indent=2)
+    # Save session summary next to the streamed results
+    summary = {
+        "start_time": start_time.isoformat(timespec='seconds'),
+        "end_time": datetime.now().isoformat(timespec='seconds'),
+        "category": category or "random",
+        "requested_count": count,
+        "successful_count": successful,
+        "skipped_count": skipped,
+        "failed_count": failed,
+        "results_file": filename
+    }
     
-    print(f"\nBulk generation log saved to: {filename}")
+    meta_filename = filename.replace('.jsonl', '.meta.json')
+    with open(meta_filename, 'w') as f:
+        json.dump(summary, f, indent=2)
     
-    # Also append to main generation log
-    log_filename = "generation_log.json"
-    logs = []
+    print(f"\nBulk generation log saved to: {filename} (summary: {meta_filename})")
     
-    try:
-        with open(log_filename, 'r') as f:
-            logs = json.load(f)
-    except:
-        pass
-    
-    # Add successful designs to main log
-    for result in results:
-        if result["status"] == "success":
-            logs.append({
-                "timestamp": result["timestamp"],
-                "design": result["design"],
-                "printful_product_id": result.get("printful_product_id"),
-                "shopify_product_id": result.get("shopify_product_id"),
-                "bulk_session": filename
-            })
-    
-    with open(log_filename, 'w') as f:
-        json.dump(logs, f, indent=2)
-    
-    return results
+    return summary
 
 def main():
     """Main function with argument parsing"""
@@ -141,7 +294,7 @@ def main():
         '--category', 
         type=str, 
         default=None,
-        choices=[''] + list(DESIGN_CATEGORIES.keys()),
+        choices=('',) + CATEGORY_NAMES,
         help='Design category (leave empty for random)'
     )
     parser.add_argument(
@@ -153,8 +306,15 @@ def main():
     parser.add_argument(
         '--delay', 
         type=int, 
-        default=5,
-        help='Delay in seconds between generations (default: 5)'
+        default=0,
+        help='Minimum delay in seconds between starting generations; API rate '
+             'limit headers are honored regardless (default: 0)'
+    )
+    parser.add_argument(
+        '--concurrency', 
+        type=int, 
+        default=3,
+        help='Number of designs to generate in parallel (default: 3)'
     )
     
     args = parser.parse_args()
@@ -162,11 +322,16 @@ def main():
     # Handle empty string category
     category = args.category if args.category else None
     
+    # Fail fast on bad credentials before paying for any designs
+    if not preflight():
+        sys.exit(1)
+    
     # Run bulk generation
     bulk_generate(
         category=category,
         count=args.count,
-        delay=args.delay
+        delay=args.delay,
+        concurrency=args.concurrency
     )
 
 if __name__ == "__main__":
@@ -4,19 +4,23 @@ Custom Prompt T-Shirt Design Generator
 Allows generation of t-shirt designs with custom prompts
 """
 
-import os
 import sys
-import json
 import argparse
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from openai import OpenAI
-from generate_tee import upload_to_printful, create_shopify_product
+from generate_tee import (
+    generate_image, upload_to_printful, create_shopify_product, save_image_async, design_saved,
+    append_log, preflight
+)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+# Characters allowed in filenames besides letters and digits
+_FILENAME_KEEP = " -_"
+# Drops every other ASCII character in a single C-level pass
+_FILENAME_DROP_TABLE = str.maketrans("", "", "".join(
+    c for c in map(chr, range(128)) if not (c.isalnum() or c in _FILENAME_KEEP)
+))
 
-def generate_custom_design(custom_prompt, style_hint=None):
+def generate_custom_design(custom_prompt, style_hint=None, variation=None):
     """Generate a t-shirt design from a custom prompt"""
     
     # Build the full prompt with t-shirt specifications
@@ -44,37 +48,27 @@ CRITICAL REQUIREMENTS:
     
     try:
         # Generate image with DALL-E 3
-        response = client.images.generate(
-            model="dall-e-3",
-            prompt=full_prompt,
-            size="1024x1024",
-            quality="standard",
-            style="vivid",
-            n=1
-        )
-        
-        image_url = response.data[0].url
-        revised_prompt = response.data[0].revised_prompt
+        image_url, revised_prompt = generate_image(full_prompt)
         
         print("Design generated successfully!")
         print(f"Revised prompt: {revised_prompt[:200]}...")
         
-        # Download the image
-        image_response = requests.get(image_url)
-        image_response.raise_for_status()
-        
         # Generate filename
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         # Create safe filename from prompt (first 30 chars, alphanumeric only)
-        safe_prompt = ''.join(c for c in custom_prompt[:30] if c.isalnum() or c in (' ', '-', '_'))
+        safe_prompt = custom_prompt[:30].translate(_FILENAME_DROP_TABLE)
+        if not safe_prompt.isascii():
+            safe_prompt = ''.join(c for c in safe_prompt if c.isalnum() or c in _FILENAME_KEEP)
         safe_prompt = safe_prompt.replace(' ', '_')
-        filename = f"design_custom_{safe_prompt}_{timestamp}.png"
+        # Variations generated side by side share a timestamp, so number them. The
+        # number goes before the timestamp, which the upload managers strip as the last two parts
+        suffix = f"_v{variation}" if variation else ""
+        filename = f"design_custom_{safe_prompt}{suffix}_{timestamp}.png"
         
-        # Save the image
-        with open(filename, 'wb') as f:
-            f.write(image_response.content)
+        # Printful fetches the design by URL, so the local copy is saved in the background
+        saved = save_image_async(image_url, filename)
         
-        print(f"Design saved as: {filename}")
+        print(f"Saving design as: {filename}")
         
         return {
             "filename": filename,
@@ -83,7 +77,8 @@ CRITICAL REQUIREMENTS:
             "prompt": full_prompt,
             "revised_prompt": revised_prompt,
             "image_url": image_url,
-            "image_data": image_response.content,
+            "image_path": filename,
+            "saved": saved,
             "custom_prompt": custom_prompt,
             "style_hint": style_hint
         }
@@ -92,6 +87,46 @@ CRITICAL REQUIREMENTS:
         print(f"Error generating design: {str(e)}")
         return None
 
+def generate_variation(index, args):
+    """Generate, optionally upload, and build the log entry for one variation"""
+    
+    if args.count > 1:
+        print(f"\n=== Generating design {index + 1} of {args.count} ===")
+    
+    design = generate_custom_design(args.prompt, args.style, variation=index + 1 if args.count > 1 else None)
+    
+    if not design:
+        print("\n❌ Failed to generate design")
+        return None
+    
+    if args.upload:
+        # Upload to stores
+        printful_id = upload_to_printful(design)
+        shopify_id = create_shopify_product(design, printful_id)
+        
+        print(f"Printful product ID: {printful_id}")
+        print(f"Shopify product ID: {shopify_id}")
+    
+    if not design_saved(design):
+        print("\n❌ Failed to save design")
+        return None
+    
+    print(f"\n✅ Success! Design saved as: {design['filename']}")
+    
+    # Log the generation
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "type": "custom",
+        "design": {
+            "filename": design["filename"],
+            "category": "custom",
+            "theme": design["theme"],
+            "custom_prompt": design["custom_prompt"],
+            "style_hint": design["style_hint"]
+        },
+        "uploaded": args.upload
+    }
+
 def main():
     """Main function with argument parsing"""
     
@@ -132,57 +167,30 @@ Examples:
         help='Number of variations to generate (default: 1)'
     )
     
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=3,
+        help='Number of variations generated in parallel (default: 3)'
+    )
+    
     args = parser.parse_args()
     
-    # Generate design(s)
-    for i in range(args.count):
-        if args.count > 1:
-            print(f"\n=== Generating design {i + 1} of {args.count} ===")
-        
-        design = generate_custom_design(args.prompt, args.style)
-        
-        if design:
-            if args.upload:
-                # Upload to stores
-                printful_id = upload_to_printful(design)
-                shopify_id = create_shopify_product(design, printful_id)
-                
-                print(f"Printful product ID: {printful_id}")
-                print(f"Shopify product ID: {shopify_id}")
-            
-            # Log the generation
-            log_entry = {
-                "timestamp": datetime.now().isoformat(),
-                "type": "custom",
-                "design": {
-                    "filename": design["filename"],
-                    "category": "custom",
-                    "theme": design["theme"],
-                    "custom_prompt": design["custom_prompt"],
-                    "style_hint": design["style_hint"]
-                },
-                "uploaded": args.upload
-            }
-            
-            # Append to log
-            log_filename = "generation_log.json"
-            logs = []
-            
-            try:
-                with open(log_filename, 'r') as f:
-                    logs = json.load(f)
-            except:
-                pass
-            
-            logs.append(log_entry)
-            
-            with open(log_filename, 'w') as f:
-                json.dump(logs, f, indent=2)
-            
-            print(f"\n✅ Success! Design saved as: {design['filename']}")
-        else:
-            print("\n❌ Failed to generate design")
-            sys.exit(1)
+    # Fail fast on bad credentials before paying for any designs
+    if not preflight(stores=args.upload):
+        sys.exit(1)
+    
+    # Generate design(s); variations only wait on DALL-E and the stores, so run them side by side
+    workers = max(1, min(args.concurrency, args.count))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        log_entries = list(pool.map(lambda i: generate_variation(i, args), range(args.count)))
+    
+    # Append to log
+    generated = [entry for entry in log_entries if entry]
+    append_log(generated)
+    
+    if len(generated) < args.count:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
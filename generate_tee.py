@@ -5,30 +5,171 @@ Generates unique t-shirt designs using DALL-E 3 and uploads to Printful/Shopify
 """
 
 import os
+import sys
 import json
 import time
 import random
+import shutil
+import hashlib
+import threading
 import requests
-from datetime import datetime
-from openai import OpenAI
-import base64
-from io import BytesIO
-from PIL import Image
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from datetime import date, datetime
+from functools import lru_cache
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib encoder
+    orjson = None
 
-# Configuration
+@lru_cache(maxsize=1)
+def get_openai_client():
+    """Create the OpenAI client on first use (openai is slow to import)"""
+    from openai import OpenAI
+    return OpenAI(api_key=OPENAI_API_KEY)
+
+# Configuration (read once at import)
+OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 PRINTFUL_API_KEY = os.environ.get("PRINTFUL_API_KEY")
 PRINTFUL_STORE_ID = os.environ.get("PRINTFUL_STORE_ID")
 SHOPIFY_STORE = os.environ.get("SHOPIFY_STORE")
 SHOPIFY_ACCESS_TOKEN = os.environ.get("SHOPIFY_ACCESS_TOKEN")
 MARKUP_PERCENT = float(os.environ.get("MARKUP_PERCENT", "1.4"))
+# DALL-E 3 images allowed per minute on the account's usage tier
+_images_per_minute = os.environ.get("OPENAI_IMAGES_PER_MINUTE", "7")
+if not _images_per_minute.strip().isdecimal() or int(_images_per_minute) < 1:
+    # Checked here rather than failing later inside a worker thread
+    raise ValueError(f"OPENAI_IMAGES_PER_MINUTE must be a whole number of at least 1 (got {_images_per_minute!r})")
+OPENAI_IMAGES_PER_MINUTE = int(_images_per_minute)
+# Set to fail preflight when Shopify credentials are missing instead of skipping Shopify
+REQUIRE_SHOPIFY = os.environ.get("REQUIRE_SHOPIFY", "").lower() in ("1", "true", "yes")
 
 # Printful API endpoints
 PRINTFUL_API_BASE = "https://api.printful.com"
 SHOPIFY_API_BASE = f"https://{SHOPIFY_STORE}.myshopify.com/admin/api/2024-01"
 
+# Per-host auth headers, built once (the session is shared across hosts,
+# so credentials are attached per request rather than on the session)
+PRINTFUL_HEADERS = {
+    "Authorization": f"Bearer {PRINTFUL_API_KEY}",
+    "Content-Type": "application/json"
+}
+SHOPIFY_HEADERS = {
+    "X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN or "",
+    "Content-Type": "application/json"
+}
+
+def _create_session():
+    """Create a pooled HTTP session with retries for transient errors"""
+    session = requests.Session()
+    # One pool per API host (OpenAI CDN, Printful, Shopify); each pool keeps up to
+    # 32 idle keep-alive sockets so concurrent bulk workers don't churn TLS handshakes
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=32,
+        pool_block=False,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            backoff_jitter=1.0,
+            status_forcelist=[429, 500, 502, 503, 504]
+        )
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+# Shared session so repeated calls to Printful/Shopify/DALL-E reuse connections
+_SESSION = _create_session()
+
+def get_session():
+    """Return the shared HTTP session"""
+    return _SESSION
+
+# Earliest time (time.monotonic) each API host may be called again,
+# derived from the rate limit headers of its last response
+_next_allowed = {}
+_rate_limit_lock = threading.Lock()
+
+def wait_for_rate_limit(host):
+    """Sleep until the host's last rate limit headers allow another call"""
+    with _rate_limit_lock:
+        delay = _next_allowed.get(host, 0) - time.monotonic()
+    
+    if delay > 0:
+        print(f"Rate limit reached for {host}, waiting {delay:.1f} seconds...")
+        time.sleep(delay)
+
+def record_rate_limit(host, response):
+    """Update the host's next allowed call time from its response headers"""
+    headers = response.headers
+    delay = 0
+    
+    try:
+        if response.status_code == 429:
+            delay = float(headers.get("Retry-After", 60))
+        elif "X-Ratelimit-Remaining" in headers:
+            # Printful: remaining calls in the window and seconds until it resets
+            if int(headers["X-Ratelimit-Remaining"]) <= 1:
+                delay = float(headers.get("X-Ratelimit-Reset", 60))
+        elif "X-Shopify-Shop-Api-Call-Limit" in headers:
+            # Shopify: leaky bucket "used/size" draining at 2 calls per second
+            used, size = map(int, headers["X-Shopify-Shop-Api-Call-Limit"].split("/"))
+            if used >= size - 1:
+                delay = 0.5
+    except ValueError:
+        return
+    
+    if delay > 0:
+        with _rate_limit_lock:
+            _next_allowed[host] = max(_next_allowed.get(host, 0), time.monotonic() + delay)
+
+def _rate_limited_post(session, host, url, **kwargs):
+    """POST through the session, honoring the host's rate limit headers"""
+    if orjson is not None and "json" in kwargs:
+        # Serialize the body with orjson instead of requests' stdlib json encoder
+        kwargs["data"] = orjson.dumps(kwargs.pop("json"))
+        kwargs["headers"] = {**kwargs.get("headers", {}), "Content-Type": "application/json"}
+    wait_for_rate_limit(host)
+    response = session.post(url, **kwargs)
+    record_rate_limit(host, response)
+    return response
+
+# DALL-E is limited in images per minute rather than by response headers, so it
+# gets a token bucket: bursts up to the minute's budget go out immediately and
+# workers only sleep once it is spent
+_image_tokens = float(OPENAI_IMAGES_PER_MINUTE)
+_image_tokens_updated = time.monotonic()
+
+def wait_for_image_slot():
+    """Spend one DALL-E image token, sleeping only while the bucket is empty"""
+    global _image_tokens, _image_tokens_updated
+    refill_rate = OPENAI_IMAGES_PER_MINUTE / 60  # tokens per second
+    
+    with _rate_limit_lock:
+        now = time.monotonic()
+        tokens = min(OPENAI_IMAGES_PER_MINUTE, _image_tokens + (now - _image_tokens_updated) * refill_rate)
+        # Reserve the token up front; a negative balance queues the waiting workers
+        _image_tokens = tokens - 1
+        _image_tokens_updated = now
+    
+    if tokens < 1:
+        delay = (1 - tokens) / refill_rate
+        print(f"DALL-E image limit reached, waiting {delay:.1f} seconds...")
+        time.sleep(delay)
+
+def _response_json(response):
+    """Decode a JSON response body, using orjson when available"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
+# Append-only generation log (one JSON record per line)
+LOG_FILENAME = "generation_log.jsonl"
+
 # Design categories with themes
 DESIGN_CATEGORIES = {
     "gaming": {
@@ -118,6 +259,45 @@ DESIGN_CATEGORIES = {
     }
 }
 
+# Category names in display order, built once for random picks and CLI choices
+CATEGORY_NAMES = tuple(DESIGN_CATEGORIES)
+
+# Spaces and path separators in themes (e.g. "birthday king/queen") become underscores
+_FILENAME_TABLE = str.maketrans({" ": "_", "/": "_", "\\": "_", ":": "_"})
+
+# Unisex Staple T-Shirt (Bella + Canvas 3001) variants as (variant_id, retail_price)
+PRINTFUL_VARIANTS = (
+    (4012, "25.00"),  # S
+    (4013, "25.00"),  # M
+    (4014, "25.00"),  # L
+    (4015, "25.00"),  # XL
+    (4016, "28.00"),  # 2XL
+)
+
+# Shopify retail prices per size, marked up from the $25 base once at import
+SHOPIFY_BASE_PRICE = 25.00
+_RETAIL_PRICE = round(SHOPIFY_BASE_PRICE * MARKUP_PERCENT, 2)
+SHOPIFY_SIZE_PRICES = (
+    ("S", str(_RETAIL_PRICE)),
+    ("M", str(_RETAIL_PRICE)),
+    ("L", str(_RETAIL_PRICE)),
+    ("XL", str(_RETAIL_PRICE)),
+    ("2XL", str(round(_RETAIL_PRICE * 1.12, 2))),
+)
+SHOPIFY_SIZE_NAMES = [size for size, _ in SHOPIFY_SIZE_PRICES]
+
+def themes_from_today(category_info, day=None):
+    """A category's themes rotated to start at today's pick
+    
+    Walking the themes one step per day spreads generations evenly across a
+    category instead of letting random picks repeat some and skip others.
+    The ordinal date keeps the rotation continuous across year boundaries.
+    """
+    themes = category_info["themes"]
+    day = day or date.today().toordinal()
+    start = day % len(themes)
+    return themes[start:] + themes[:start]
+
 def generate_design_prompt(category_name, theme, style):
     """Generate an optimized prompt for single t-shirt designs"""
     
@@ -144,16 +324,75 @@ Do not create multiple options, before/after, or comparison layouts."""
 
     return prompt
 
-def generate_design(category=None):
+def download_image(image_url, filename, session=None):
+    """Stream an image from a URL to a local file"""
+    session = session or _SESSION
+    
+    with session.get(image_url, stream=True, timeout=30) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        with open(filename, 'wb') as f:
+            shutil.copyfileobj(response.raw, f, length=1 << 16)
+    
+    return filename
+
+# Small pool that writes local design copies off the upload path; its threads
+# are joined at interpreter exit, so every PNG is on disk before the run ends
+_IO_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="design-save")
+
+def save_image_async(image_url, filename, session=None):
+    """Start downloading an image to disk in the background, returning a Future"""
+    future = _IO_POOL.submit(download_image, image_url, filename, session)
+    
+    def report_failure(done):
+        if done.exception() is not None:
+            print(f"Error saving {filename}: {done.exception()}")
+    
+    future.add_done_callback(report_failure)
+    return future
+
+def design_saved(design):
+    """Wait for a design's background save, returning whether the local file was written"""
+    saved = design.get("saved")
+    if saved is None:
+        return True
+    
+    try:
+        saved.result()
+        return True
+    except Exception:
+        return False  # Already reported by save_image_async
+
+def generate_image(prompt, *, openai_client=None):
+    """Generate a single image with DALL-E 3, returning its URL and revised prompt"""
+    openai_client = openai_client or get_openai_client()
+    
+    wait_for_image_slot()
+    response = openai_client.images.generate(
+        model="dall-e-3",
+        prompt=prompt,
+        size="1024x1024",
+        quality="standard",
+        style="vivid",
+        n=1  # Always generate only 1 image
+    )
+    
+    return response.data[0].url, response.data[0].revised_prompt
+
+def prompt_hash(prompt):
+    """Short stable digest of a prompt, used to spot repeats"""
+    return hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).hexdigest()
+
+def generate_design(category=None, *, theme=None, openai_client=None, session=None):
     """Generate a single t-shirt design"""
     
     # Select random category if not specified
     if not category:
-        category = random.choice(list(DESIGN_CATEGORIES.keys()))
+        category = random.choice(CATEGORY_NAMES)
     
     # Get category details
     category_info = DESIGN_CATEGORIES.get(category, DESIGN_CATEGORIES["abstract"])
-    theme = random.choice(category_info["themes"])
+    theme = theme or themes_from_today(category_info)[0]
     style = category_info["style"]
     
     # Generate the design prompt
@@ -165,33 +404,19 @@ def generate_design(category=None):
     
     try:
         # Generate image with DALL-E 3
-        response = client.images.generate(
-            model="dall-e-3",
-            prompt=prompt,
-            size="1024x1024",
-            quality="standard",
-            style="vivid",
-            n=1  # Always generate only 1 image
-        )
-        
-        image_url = response.data[0].url
-        revised_prompt = response.data[0].revised_prompt
+        image_url, revised_prompt = generate_image(prompt, openai_client=openai_client)
         
         print(f"Design generated successfully!")
         print(f"Revised prompt: {revised_prompt[:200]}...")
         
-        # Download the image
-        image_response = requests.get(image_url)
-        image_response.raise_for_status()
-        
-        # Save the image
+        # Download the image straight to disk
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"design_{category}_{theme.replace(' ', '_')}_{timestamp}.png"
+        filename = f"design_{category}_{theme.translate(_FILENAME_TABLE)}_{timestamp}.png"
         
-        with open(filename, 'wb') as f:
-            f.write(image_response.content)
+        # Printful fetches the design by URL, so the local copy is saved in the background
+        saved = save_image_async(image_url, filename, session=session)
         
-        print(f"Design saved as: {filename}")
+        print(f"Saving design as: {filename}")
         
         return {
             "filename": filename,
@@ -200,82 +425,75 @@ def generate_design(category=None):
             "prompt": prompt,
             "revised_prompt": revised_prompt,
             "image_url": image_url,
-            "image_data": image_response.content
+            "image_path": filename,
+            "saved": saved
         }
         
     except Exception as e:
         print(f"Error generating design: {str(e)}")
         return None
 
-def upload_to_printful(design_data):
+def upload_to_printful(design_data, session=None):
     """Upload design to Printful"""
     
     if not PRINTFUL_API_KEY:
         print("Printful API key not configured, skipping upload")
         return None
     
-    headers = {
-        "Authorization": f"Bearer {PRINTFUL_API_KEY}",
-        "Content-Type": "application/json"
-    }
+    session = session or _SESSION
+    headers = PRINTFUL_HEADERS
     
     try:
         # First, upload the image file
         files_url = f"{PRINTFUL_API_BASE}/files"
         
-        # Convert image to base64
-        image_base64 = base64.b64encode(design_data["image_data"]).decode('utf-8')
+        image_url = design_data.get("image_url")
+        response = None
         
-        file_data = {
-            "name": design_data["filename"],
-            "contents": f"data:image/png;base64,{image_base64}"
-        }
+        if image_url:
+            # Let Printful fetch the DALL-E image itself (URLs stay valid for ~1 hour)
+            file_data = {
+                "type": "default",
+                "url": image_url,
+                "filename": design_data["filename"]
+            }
+            response = _rate_limited_post(session, "printful", files_url, json=file_data, headers=headers, timeout=60)
+            if not response.ok and design_data.get("image_path"):
+                print(f"Printful could not fetch the image URL ({response.status_code}), uploading the local copy")
+                image_url = response = None
+        
+        if response is None:
+            # Stream the local PNG as multipart instead of inlining a base64 data: URL
+            if design_data.get("saved") is not None:
+                design_data["saved"].result()
+            with open(design_data["image_path"], 'rb') as f:
+                files = {'file': (design_data["filename"], f, 'image/png')}
+                # requests sets the multipart Content-Type (with boundary) itself
+                multipart_headers = {"Authorization": headers["Authorization"]}
+                response = _rate_limited_post(session, "printful", files_url, files=files,
+                                              data={'type': 'default'}, headers=multipart_headers, timeout=60)
         
-        response = requests.post(files_url, json=file_data, headers=headers)
         response.raise_for_status()
         
-        file_id = response.json()["result"]["id"]
+        file_id = _response_json(response)["result"]["id"]
         print(f"File uploaded to Printful with ID: {file_id}")
         
         # Create a product
         product_data = {
             "sync_product": {
-                "name": f"{design_data['category'].title()} - {design_data['theme'].title()}",
-                "thumbnail": f"data:image/png;base64,{image_base64[:1000]}..."  # Truncated for thumbnail
+                "name": f"{design_data['category'].title()} - {design_data['theme'].title()}"
             },
             "sync_variants": [
                 {
-                    "variant_id": 4012,  # Unisex Staple T-Shirt (Bella + Canvas 3001) - S
-                    "retail_price": "25.00",
-                    "files": [
-                        {
-                            "id": file_id,
-                            "type": "default"
-                        }
-                    ]
-                },
-                {
-                    "variant_id": 4013,  # M
-                    "retail_price": "25.00",
-                    "files": [{"id": file_id, "type": "default"}]
-                },
-                {
-                    "variant_id": 4014,  # L
-                    "retail_price": "25.00",
-                    "files": [{"id": file_id, "type": "default"}]
-                },
-                {
-                    "variant_id": 4015,  # XL
-                    "retail_price": "25.00",
-                    "files": [{"id": file_id, "type": "default"}]
-                },
-                {
-                    "variant_id": 4016,  # 2XL
-                    "retail_price": "28.00",
+                    "variant_id": variant_id,
+                    "retail_price": retail_price,
                     "files": [{"id": file_id, "type": "default"}]
                 }
+                for variant_id, retail_price in PRINTFUL_VARIANTS
             ]
         }
+        if image_url:
+            product_data["sync_product"]["thumbnail"] = image_url
         
         # Add store ID if configured
         if PRINTFUL_STORE_ID:
@@ -283,10 +501,10 @@ def upload_to_printful(design_data):
         else:
             product_url = f"{PRINTFUL_API_BASE}/sync/products"
         
-        response = requests.post(product_url, json=product_data, headers=headers)
+        response = _rate_limited_post(session, "printful", product_url, json=product_data, headers=headers, timeout=30)
         response.raise_for_status()
         
-        product_id = response.json()["result"]["id"]
+        product_id = _response_json(response)["result"]["id"]
         print(f"Product created in Printful with ID: {product_id}")
         
         return product_id
@@ -295,23 +513,18 @@ def upload_to_printful(design_data):
         print(f"Error uploading to Printful: {str(e)}")
         return None
 
-def create_shopify_product(design_data, printful_product_id=None):
+def create_shopify_product(design_data, printful_product_id=None, session=None):
     """Create product in Shopify"""
     
     if not SHOPIFY_STORE or not SHOPIFY_ACCESS_TOKEN:
         print("Shopify not configured, skipping product creation")
         return None
     
-    headers = {
-        "X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN,
-        "Content-Type": "application/json"
-    }
+    session = session or _SESSION
+    headers = SHOPIFY_HEADERS
     
     try:
-        # Calculate prices with markup
-        base_price = 25.00
-        retail_price = round(base_price * MARKUP_PERCENT, 2)
-        
+        category = design_data['category']
         product_data = {
             "product": {
                 "title": f"{design_data['category'].title()} T-Shirt - {design_data['theme'].title()}",
@@ -320,23 +533,20 @@ def create_shopify_product(design_data, printful_product_id=None):
                 "product_type": "T-Shirt",
                 "tags": f"{design_data['category']}, ai-generated, t-shirt, {design_data['theme']}",
                 "variants": [
-                    {"option1": "S", "price": str(retail_price), "sku": f"TEE-{design_data['category']}-S"},
-                    {"option1": "M", "price": str(retail_price), "sku": f"TEE-{design_data['category']}-M"},
-                    {"option1": "L", "price": str(retail_price), "sku": f"TEE-{design_data['category']}-L"},
-                    {"option1": "XL", "price": str(retail_price), "sku": f"TEE-{design_data['category']}-XL"},
-                    {"option1": "2XL", "price": str(round(retail_price * 1.12, 2)), "sku": f"TEE-{design_data['category']}-2XL"}
+                    {"option1": size, "price": price, "sku": f"TEE-{category}-{size}"}
+                    for size, price in SHOPIFY_SIZE_PRICES
                 ],
                 "options": [
-                    {"name": "Size", "values": ["S", "M", "L", "XL", "2XL"]}
+                    {"name": "Size", "values": SHOPIFY_SIZE_NAMES}
                 ]
             }
         }
         
         url = f"{SHOPIFY_API_BASE}/products.json"
-        response = requests.post(url, json=product_data, headers=headers)
+        response = _rate_limited_post(session, "shopify", url, json=product_data, headers=headers, timeout=30)
         response.raise_for_status()
         
-        shopify_product = response.json()["product"]
+        shopify_product = _response_json(response)["product"]
         print(f"Product created in Shopify: {shopify_product['title']}")
         
         return shopify_product["id"]
@@ -345,14 +555,255 @@ def create_shopify_product(design_data, printful_product_id=None):
         print(f"Error creating Shopify product: {str(e)}")
         return None
 
+def _shopify_product_input(design_data):
+    """Build a GraphQL ProductInput for a design"""
+    category = design_data['category']
+    theme = design_data['theme']
+    
+    return {
+        "title": f"{category.title()} T-Shirt - {theme.title()}",
+        "descriptionHtml": f"<p>Unique {category} themed t-shirt featuring {theme}.</p><p>Designed with AI and printed on demand on high-quality fabric.</p>",
+        "vendor": "AI Designs",
+        "productType": "T-Shirt",
+        "tags": [category, "ai-generated", "t-shirt", theme],
+        "options": ["Size"],
+        "variants": [
+            {"options": [size], "price": price, "sku": f"TEE-{category}-{size}"}
+            for size, price in SHOPIFY_SIZE_PRICES
+        ]
+    }
+
+def create_shopify_products(designs, session=None):
+    """Create several Shopify products with one GraphQL request
+    
+    Returns a list of product IDs in the same order as designs, with None
+    for any design Shopify rejected.
+    """
+    
+    if not SHOPIFY_STORE or not SHOPIFY_ACCESS_TOKEN:
+        print("Shopify not configured, skipping product creation")
+        return [None] * len(designs)
+    
+    if not designs:
+        return []
+    
+    session = session or _SESSION
+    
+    # One aliased productCreate per design, all in a single mutation
+    params = ", ".join(f"$p{i}: ProductInput!" for i in range(len(designs)))
+    fields = "\n".join(
+        f"  p{i}: productCreate(input: $p{i}) {{ product {{ id title }} userErrors {{ field message }} }}"
+        for i in range(len(designs))
+    )
+    query = f"mutation CreateProducts({params}) {{\n{fields}\n}}"
+    variables = {f"p{i}": _shopify_product_input(design) for i, design in enumerate(designs)}
+    
+    try:
+        url = f"{SHOPIFY_API_BASE}/graphql.json"
+        response = _rate_limited_post(session, "shopify", url, json={"query": query, "variables": variables},
+                                      headers=SHOPIFY_HEADERS, timeout=60)
+        response.raise_for_status()
+        
+        body = _response_json(response)
+        if body.get("errors"):
+            print(f"Error creating Shopify products: {body['errors']}")
+            return [None] * len(designs)
+        
+        product_ids = []
+        for i in range(len(designs)):
+            payload = (body.get("data") or {}).get(f"p{i}") or {}
+            product = payload.get("product")
+            
+            if product:
+                print(f"Product created in Shopify: {product['title']}")
+                # "gid://shopify/Product/123" -> 123, matching the REST product id
+                product_ids.append(int(product["id"].rsplit("/", 1)[-1]))
+            else:
+                print(f"Error creating Shopify product: {payload.get('userErrors')}")
+                product_ids.append(None)
+        
+        return product_ids
+        
+    except Exception as e:
+        print(f"Error creating Shopify products: {str(e)}")
+        return [None] * len(designs)
+
+def json_line(record):
+    """Serialize a record as one compact, newline-terminated JSON line (bytes)"""
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode('utf-8')
+
+def append_log(entries, log_filename=LOG_FILENAME):
+    """Append records to the generation log without re-reading it"""
+    with open(log_filename, 'ab', buffering=1 << 16) as f:
+        for entry in entries:
+            f.write(json_line(entry))
+
+def tail_log(n, log_filename=LOG_FILENAME):
+    """Return the last n records from the generation log, skipping unreadable lines"""
+    try:
+        with open(log_filename, 'r') as f:
+            lines = deque(f, maxlen=n)
+    except FileNotFoundError:
+        return []
+    
+    records = []
+    for line in lines:
+        # A killed writer can leave a truncated line; it must not break later runs
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict):
+            records.append(record)
+    return records
+
+def designs_made_today(window=500, log_filename=LOG_FILENAME):
+    """(category, theme) pairs that became Printful products today, read from the tail of the log"""
+    today = date.today().isoformat()
+    return {
+        (record["design"].get("category"), record["design"].get("theme"))
+        for record in tail_log(window, log_filename)
+        if str(record.get("timestamp", "")).startswith(today)
+        and isinstance(record.get("design"), dict)
+        # A failed upload is worth retrying, so only count designs Printful accepted
+        and record.get("printful_product_id") is not None
+    }
+
+# Successful preflights are remembered per credential set for a few hours
+PREFLIGHT_CACHE_FILE = os.path.expanduser(
+    os.environ.get("TSHIRT_PREFLIGHT_CACHE", "~/.cache/tshirt/preflight.json")
+)
+PREFLIGHT_TTL = 6 * 60 * 60  # seconds
+PREFLIGHT_CACHE_SIZE = 32
+
+def _preflight_key(stores):
+    """Digest identifying the credentials a preflight checks (never the secrets themselves)"""
+    material = "\0".join([
+        OPENAI_API_KEY or "",
+        PRINTFUL_API_KEY or "", PRINTFUL_STORE_ID or "",
+        SHOPIFY_STORE or "", SHOPIFY_ACCESS_TOKEN or "",
+        "stores" if stores else ""
+    ])
+    return hashlib.blake2b(material.encode('utf-8'), digest_size=16).hexdigest()
+
+def _load_preflight_cache():
+    """Read the preflight cache, treating a missing or corrupt file as empty"""
+    try:
+        with open(PREFLIGHT_CACHE_FILE, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    
+    # Anything but a {key: timestamp} object is as good as corrupt
+    if not isinstance(cache, dict) or not all(
+        isinstance(ts, (int, float)) and not isinstance(ts, bool) for ts in cache.values()
+    ):
+        return {}
+    return cache
+
+def _save_preflight_cache(cache):
+    """Write the preflight cache, dropping expired and excess entries"""
+    now = time.time()
+    fresh = sorted(
+        ((key, ts) for key, ts in cache.items() if now - ts < PREFLIGHT_TTL),
+        key=lambda item: item[1]
+    )[-PREFLIGHT_CACHE_SIZE:]
+    try:
+        os.makedirs(os.path.dirname(PREFLIGHT_CACHE_FILE), exist_ok=True)
+        with open(PREFLIGHT_CACHE_FILE, 'w') as f:
+            json.dump(dict(fresh), f)
+    except OSError:
+        pass  # The cache only saves round-trips; never fail a run over it
+
+def preflight(stores=True, session=None):
+    """Check credentials once before spending any DALL-E quota
+    
+    Missing or rejected OpenAI credentials fail the check. Printful and
+    Shopify are optional, so they are only checked when configured (unless
+    REQUIRE_SHOPIFY is set), and only an authentication error (401/403)
+    from them fails it. A clean pass is cached on disk for PREFLIGHT_TTL
+    so repeated runs skip the round-trips.
+    """
+    
+    if not OPENAI_API_KEY:
+        print("Preflight failed: OPENAI_API_KEY is not set")
+        return False
+    
+    if stores and REQUIRE_SHOPIFY and not (SHOPIFY_STORE and SHOPIFY_ACCESS_TOKEN):
+        print("Preflight failed: REQUIRE_SHOPIFY is set but SHOPIFY_STORE/SHOPIFY_ACCESS_TOKEN are missing")
+        return False
+    
+    cache = _load_preflight_cache()
+    cache_key = _preflight_key(stores)
+    if time.time() - cache.get(cache_key, 0) < PREFLIGHT_TTL:
+        print("Preflight: credentials verified recently, skipping checks")
+        return True
+    
+    session = session or _SESSION
+    ok = True
+    clean = True
+    
+    try:
+        get_openai_client().models.list()
+    except Exception as e:
+        print(f"Preflight failed: OpenAI rejected the API key ({str(e)})")
+        return False
+    
+    checks = []
+    if stores and PRINTFUL_API_KEY:
+        headers = dict(PRINTFUL_HEADERS)
+        if PRINTFUL_STORE_ID:
+            headers["X-PF-Store-Id"] = PRINTFUL_STORE_ID
+        checks.append(("Printful", f"{PRINTFUL_API_BASE}/store", headers))
+    if stores and SHOPIFY_STORE and SHOPIFY_ACCESS_TOKEN:
+        checks.append(("Shopify", f"{SHOPIFY_API_BASE}/shop.json", SHOPIFY_HEADERS))
+    
+    for name, url, headers in checks:
+        try:
+            response = session.get(url, headers=headers, timeout=15)
+        except requests.RequestException as e:
+            print(f"Preflight warning: could not reach {name} ({str(e)})")
+            clean = False
+            continue
+        
+        if response.status_code in (401, 403):
+            print(f"Preflight failed: {name} rejected the credentials ({response.status_code})")
+            ok = False
+        elif response.status_code != 200:
+            print(f"Preflight warning: {name} returned {response.status_code}")
+            clean = False
+    
+    # Only a fully verified pass is worth skipping next time
+    if ok and clean:
+        cache[cache_key] = time.time()
+        _save_preflight_cache(cache)
+    
+    return ok
+
 def main():
     """Main function to generate and upload design"""
     
     print("=== T-Shirt Design Generator ===")
-    print(f"Available categories: {', '.join(DESIGN_CATEGORIES.keys())}")
+    print(f"Available categories: {', '.join(CATEGORY_NAMES)}")
+    
+    if not preflight():
+        sys.exit(1)
+    
+    # Re-runs on the same day skip categories whose theme of the day already
+    # became a product, instead of paying for a duplicate
+    made_today = designs_made_today()
+    candidates = [
+        name for name in CATEGORY_NAMES
+        if (name, themes_from_today(DESIGN_CATEGORIES[name])[0]) not in made_today
+    ]
+    if not candidates:
+        print("Every category's theme of the day has already been generated today")
+        return
     
     # Generate design
-    design = generate_design()
+    design = generate_design(random.choice(candidates))
     
     if design:
         # Upload to Printful
@@ -365,7 +816,8 @@ def main():
         log_data = {
             "timestamp": datetime.now().isoformat(),
             "design": {
-                "filename": design["filename"],
+                # The local copy is optional once Printful has the URL; only log it if it exists
+                "filename": design["filename"] if design_saved(design) else None,
                 "category": design["category"],
                 "theme": design["theme"],
                 "prompt": design["prompt"]
@@ -375,19 +827,9 @@ def main():
         }
         
         # Append to log file
-        log_filename = "generation_log.json"
-        logs = []
-        
-        if os.path.exists(log_filename):
-            with open(log_filename, 'r') as f:
-                logs = json.load(f)
-        
-        logs.append(log_data)
-        
-        with open(log_filename, 'w') as f:
-            json.dump(logs, f, indent=2)
+        append_log([log_data])
         
-        print(f"\nGeneration complete! Check {log_filename} for details.")
+        print(f"\nGeneration complete! Check {LOG_FILENAME} for details.")
         
     else:
         print("Failed to generate design")
@@ -111,19 +111,19 @@ def main():
             'handle': config['handle'],
             'theme': config['theme']
         }
-        logger.info(f"✅ Added mapping for '{config['title']}'")
+        logger.info("✅ Added mapping for '%s'", config['title'])
     
     # Save mapping to JSON file
     with open('collections.json', 'w') as f:
         json.dump(collections_mapping, f, indent=2)
     
-    logger.info(f"✅ Successfully created {len(collections_mapping)} collection mappings")
+    logger.info("✅ Successfully created %d collection mappings", len(collections_mapping))
     logger.info("Collections mapping saved to collections.json")
     logger.info("NOTE: No actual Shopify collections were created - products will be ungrouped")
     
     # Print summary
     for key, collection in collections_mapping.items():
-        logger.info(f"  {key}: {collection['title']}")
+        logger.info("  %s: %s", key, collection['title'])
 
 if __name__ == "__main__":
     main()
@@ -8,11 +8,29 @@ import os
 import requests
 import json
 import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configuration
 PRINTFUL_API_KEY = os.environ.get('PRINTFUL_API_KEY')
 STORE_ID = os.environ.get('PRINTFUL_STORE_ID')
 
+# One keep-alive connection for every call; 429s wait out Retry-After instead of fixed sleeps.
+# Read timeouts and dropped responses are not retried (read=0, other=0): the POST
+# may already have created the file or product
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(max_retries=Retry(
+    total=5,
+    read=0,
+    other=0,
+    backoff_factor=0.5,
+    backoff_jitter=1.0,
+    status_forcelist=[429, 500, 502, 503, 504],
+    allowed_methods=["GET", "POST"],
+    respect_retry_after_header=True,
+    raise_on_status=False
+)))
+
 # Test image URLs (using free, publicly available images)
 TEST_IMAGES = [
     {
@@ -51,7 +69,7 @@ def test_url_upload():
         }
         
         try:
-            response = requests.post(url, headers=headers, json=data)
+            response = SESSION.post(url, headers=headers, json=data, timeout=60)
             print(f"   Status: {response.status_code}")
             
             if response.status_code in [200, 201]:
@@ -71,9 +89,6 @@ def test_url_upload():
                 
         except Exception as e:
             print(f"   ❌ Error: {e}")
-        
-        # Delay between tests
-        time.sleep(2)
 
 def test_create_product(file_id, headers):
     """Test creating a product with the uploaded file."""
@@ -97,7 +112,7 @@ def test_create_product(file_id, headers):
     }
     
     try:
-        response = requests.post(url, headers=headers, json=product_data)
+        response = SESSION.post(url, headers=headers, json=product_data, timeout=30)
         print(f"   Product creation status: {response.status_code}")
         
         if response.status_code in [200, 201]:
@@ -130,7 +145,7 @@ def test_list_files():
     }
     
     try:
-        response = requests.get(url, headers=headers)
+        response = SESSION.get(url, headers=headers, timeout=30)
         print(f"Status: {response.status_code}")
         
         if response.status_code == 200:
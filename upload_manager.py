@@ -6,15 +6,21 @@ Processes all designs in a directory and tracks upload status
 
 import os
 import json
-import time
 import requests
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 from pathlib import Path
-from PIL import Image
 import base64
 import hashlib
 
+try:
+    import orjson
+except ImportError:  # optional, falls back to the stdlib encoder
+    orjson = None
+
 # Configuration
 PRINTFUL_API_KEY = os.environ.get("PRINTFUL_API_KEY")
 PRINTFUL_STORE_ID = os.environ.get("PRINTFUL_STORE_ID")
@@ -29,6 +35,54 @@ SHOPIFY_API_BASE = f"https://{SHOPIFY_STORE}.myshopify.com/admin/api/2024-01" if
 # Upload tracking file
 UPLOAD_TRACKER_FILE = "upload_tracker.json"
 
+# Bella + Canvas 3001 sizes as (size, Printful variant_id, has 2XL upcharge)
+SIZE_VARIANTS = (
+    ("S", 4012, False),
+    ("M", 4013, False),
+    ("L", 4014, False),
+    ("XL", 4015, False),
+    ("2XL", 4016, True),
+)
+SIZE_NAMES = [size for size, _, _ in SIZE_VARIANTS]
+UPCHARGE_2XL = 1.12
+
+# Console section separator
+SEPARATOR = "=" * 60
+
+def _create_session():
+    """Create a pooled HTTP session that waits out rate limits"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=32,
+        # Printful answers 429 before doing any work, so even POSTs are safe
+        # to resend once the Retry-After delay has passed. A read timeout or
+        # dropped response may mean the POST went through, so those are never
+        # resent (read=0, other=0); only failed connects and 429s are retried
+        max_retries=Retry(
+            total=3,
+            read=0,
+            other=0,
+            backoff_factor=0.5,
+            backoff_jitter=1.0,
+            status_forcelist=[429],
+            allowed_methods=None,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+    )
+    session.mount("https://", adapter)
+    return session
+
+# Shared session so Printful/Shopify calls reuse connections across designs
+_SESSION = _create_session()
+
+def _response_json(response):
+    """Decode a JSON response body, using orjson when available"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
 class UploadManager:
     def __init__(self, upload_dir=".", dry_run=False):
         self.upload_dir = Path(upload_dir)
@@ -37,15 +91,26 @@ class UploadManager:
         
     def load_tracker(self):
         """Load upload tracking data"""
-        if os.path.exists(UPLOAD_TRACKER_FILE):
+        try:
             with open(UPLOAD_TRACKER_FILE, 'r') as f:
                 return json.load(f)
-        return {"uploaded": {}, "failed": {}, "stats": {"total_uploaded": 0, "total_failed": 0}}
+        except FileNotFoundError:
+            return {"uploaded": {}, "failed": {}, "stats": {"total_uploaded": 0, "total_failed": 0}}
     
     def save_tracker(self):
-        """Save upload tracking data"""
-        with open(UPLOAD_TRACKER_FILE, 'w') as f:
-            json.dump(self.tracker, f, indent=2)
+        """Save upload tracking data (written to a temp file and swapped in, so a crash never truncates it)"""
+        if orjson is not None:
+            data = orjson.dumps(self.tracker, option=orjson.OPT_INDENT_2)
+        else:
+            data = json.dumps(self.tracker, indent=2).encode('utf-8')
+        
+        tmp_file = f"{UPLOAD_TRACKER_FILE}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+            # The data must be on disk before the rename, or a power loss can leave an empty tracker
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, UPLOAD_TRACKER_FILE)
     
     def get_file_hash(self, filepath):
         """Generate hash of file for tracking"""
@@ -84,31 +149,41 @@ class UploadManager:
         }
         
         try:
-            print("  📤 Uploading to Printful...")
-            
-            # Read image file
-            with open(filepath, 'rb') as f:
-                image_data = f.read()
-            
-            # Upload file
-            files_url = f"{PRINTFUL_API_BASE}/files"
-            files = {
-                'file': (os.path.basename(filepath), image_data, 'image/png')
-            }
+            # Reuse the file from an earlier attempt (e.g. product creation failed)
+            file_ids = self.tracker.setdefault("printful_files", {})
+            file_id = file_ids.get(design_info["file_hash"])
             
-            response = requests.post(
-                files_url,
-                headers=headers,
-                files=files,
-                data={'type': 'default'}
-            )
-            
-            if response.status_code != 200:
-                print(f"  ❌ Printful file upload failed: {response.status_code} - {response.text}")
-                return None
+            if file_id:
+                print(f"  ♻️  Reusing Printful file ID: {file_id}")
+            else:
+                print("  📤 Uploading to Printful...")
+                
+                # Upload file, streamed from disk
+                files_url = f"{PRINTFUL_API_BASE}/files"
+                with open(filepath, 'rb') as f:
+                    files = {
+                        'file': (os.path.basename(filepath), f, 'image/png')
+                    }
+                    
+                    response = _SESSION.post(
+                        files_url,
+                        headers=headers,
+                        files=files,
+                        data={'type': 'default'}
+                    )
                 
-            file_id = response.json()["result"]["id"]
-            print(f"  ✅ File uploaded with ID: {file_id}")
+                if response.status_code != 200:
+                    print(f"  ❌ Printful file upload failed: {response.status_code} - {response.text}")
+                    return None
+                    
+                file_id = _response_json(response)["result"]["id"]
+                file_ids[design_info["file_hash"]] = file_id
+                print(f"  ✅ File uploaded with ID: {file_id}")
+            
+            # Price strings are formatted once and every variant shares one files list
+            price = f"{design_info['base_price']:.2f}"
+            price_2xl = f"{design_info['base_price'] * UPCHARGE_2XL:.2f}"
+            files = [{"id": file_id}]
             
             # Create product
             product_data = {
@@ -116,31 +191,8 @@ class UploadManager:
                     "name": f"{design_info['category'].title()} - {design_info['theme'].title()}"
                 },
                 "sync_variants": [
-                    {
-                        "variant_id": 4012,  # S
-                        "retail_price": f"{design_info['base_price']:.2f}",
-                        "files": [{"id": file_id}]
-                    },
-                    {
-                        "variant_id": 4013,  # M
-                        "retail_price": f"{design_info['base_price']:.2f}",
-                        "files": [{"id": file_id}]
-                    },
-                    {
-                        "variant_id": 4014,  # L
-                        "retail_price": f"{design_info['base_price']:.2f}",
-                        "files": [{"id": file_id}]
-                    },
-                    {
-                        "variant_id": 4015,  # XL
-                        "retail_price": f"{design_info['base_price']:.2f}",
-                        "files": [{"id": file_id}]
-                    },
-                    {
-                        "variant_id": 4016,  # 2XL
-                        "retail_price": f"{design_info['base_price'] * 1.12:.2f}",
-                        "files": [{"id": file_id}]
-                    }
+                    {"variant_id": variant_id, "retail_price": price_2xl if upcharge else price, "files": files}
+                    for _, variant_id, upcharge in SIZE_VARIANTS
                 ]
             }
             
@@ -150,7 +202,7 @@ class UploadManager:
             else:
                 product_url = f"{PRINTFUL_API_BASE}/sync/products"
             
-            response = requests.post(
+            response = _SESSION.post(
                 product_url,
                 json=product_data,
                 headers={**headers, "Content-Type": "application/json"}
@@ -160,7 +212,7 @@ class UploadManager:
                 print(f"  ❌ Printful product creation failed: {response.status_code}")
                 return None
                 
-            product_id = response.json()["result"]["id"]
+            product_id = _response_json(response)["result"]["id"]
             print(f"  ✅ Printful product created: ID {product_id}")
             
             return {
@@ -190,6 +242,10 @@ class UploadManager:
             with open(filepath, 'rb') as f:
                 image_base64 = base64.b64encode(f.read()).decode('utf-8')
             
+            price = f"{design_info['retail_price']:.2f}"
+            price_2xl = f"{design_info['retail_price'] * UPCHARGE_2XL:.2f}"
+            sku_prefix = f"TEE-{design_info['file_hash'][:8]}"
+            
             product_data = {
                 "product": {
                     "title": f"{design_info['category'].title()} T-Shirt - {design_info['theme'].title()}",
@@ -205,48 +261,29 @@ class UploadManager:
                     ],
                     "variants": [
                         {
-                            "option1": "S",
-                            "price": f"{design_info['retail_price']:.2f}",
-                            "sku": f"TEE-{design_info['file_hash'][:8]}-S"
-                        },
-                        {
-                            "option1": "M",
-                            "price": f"{design_info['retail_price']:.2f}",
-                            "sku": f"TEE-{design_info['file_hash'][:8]}-M"
-                        },
-                        {
-                            "option1": "L",
-                            "price": f"{design_info['retail_price']:.2f}",
-                            "sku": f"TEE-{design_info['file_hash'][:8]}-L"
-                        },
-                        {
-                            "option1": "XL",
-                            "price": f"{design_info['retail_price']:.2f}",
-                            "sku": f"TEE-{design_info['file_hash'][:8]}-XL"
-                        },
-                        {
-                            "option1": "2XL",
-                            "price": f"{design_info['retail_price'] * 1.12:.2f}",
-                            "sku": f"TEE-{design_info['file_hash'][:8]}-2XL"
+                            "option1": size,
+                            "price": price_2xl if upcharge else price,
+                            "sku": f"{sku_prefix}-{size}"
                         }
+                        for size, _, upcharge in SIZE_VARIANTS
                     ],
                     "options": [
                         {
                             "name": "Size",
-                            "values": ["S", "M", "L", "XL", "2XL"]
+                            "values": SIZE_NAMES
                         }
                     ]
                 }
             }
             
             url = f"{SHOPIFY_API_BASE}/products.json"
-            response = requests.post(url, json=product_data, headers=headers)
+            response = _SESSION.post(url, json=product_data, headers=headers)
             
             if response.status_code != 201:
                 print(f"  ❌ Shopify creation failed: {response.status_code}")
                 return None
                 
-            product = response.json()["product"]
+            product = _response_json(response)["product"]
             print(f"  ✅ Shopify product created: {product['title']}")
             
             return {
@@ -263,8 +300,7 @@ class UploadManager:
         filename = os.path.basename(filepath)
         file_hash = self.get_file_hash(filepath)
         
-        print(f"\n{'='*60}")
-        print(f"📁 Processing: {filename}")
+        print(f"\n{SEPARATOR}\n📁 Processing: {filename}")
         
         # Check if already uploaded
         if self.is_uploaded(filepath):
@@ -297,15 +333,17 @@ class UploadManager:
             print("🔍 DRY RUN - Would upload this file")
             return True
         
-        # Upload to Printful
-        printful_result = None
-        if PRINTFUL_API_KEY:
-            printful_result = self.upload_to_printful(filepath, design_info)
+        # Printful upload and Shopify product creation don't depend on each other,
+        # so run them side by side instead of paying both round-trips in series
+        printful_future = shopify_future = None
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            if PRINTFUL_API_KEY:
+                printful_future = executor.submit(self.upload_to_printful, filepath, design_info)
+            if SHOPIFY_STORE:
+                shopify_future = executor.submit(self.create_shopify_product, filepath, design_info)
         
-        # Create Shopify product
-        shopify_result = None
-        if SHOPIFY_STORE:
-            shopify_result = self.create_shopify_product(filepath, design_info, printful_result)
+        printful_result = printful_future.result() if printful_future else None
+        shopify_result = shopify_future.result() if shopify_future else None
         
         # Track upload
         if printful_result or shopify_result:
@@ -353,7 +391,6 @@ class UploadManager:
                     skipped += 1
                 elif self.process_file(filepath):
                     uploaded += 1
-                    time.sleep(2)  # Rate limiting
                 else:
                     failed += 1
             except Exception as e:
@@ -361,9 +398,7 @@ class UploadManager:
                 failed += 1
         
         # Summary
-        print(f"\n{'='*60}")
-        print("📊 UPLOAD SUMMARY")
-        print(f"{'='*60}")
+        print(f"\n{SEPARATOR}\n📊 UPLOAD SUMMARY\n{SEPARATOR}")
         print(f"✅ Uploaded: {uploaded}")
         print(f"⏭️  Skipped: {skipped}")
         print(f"❌ Failed: {failed}")
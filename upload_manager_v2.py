@@ -12,14 +12,23 @@ Key changes:
 import os
 import json
 import time
+import threading
 import requests
 import argparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 import hashlib
 import base64
 from urllib.parse import urlparse
 
+try:
+    import orjson
+except ImportError:  # stdlib json via requests is fine, just slower
+    orjson = None
+
 # Configuration
 PRINTFUL_API_KEY = os.environ.get("PRINTFUL_API_KEY")  # OAuth Bearer token
 PRINTFUL_STORE_ID = os.environ.get("PRINTFUL_STORE_ID")
@@ -30,6 +39,8 @@ MARKUP_PERCENT = float(os.environ.get("MARKUP_PERCENT", "1.4"))
 # GitHub repository info for hosting files
 GITHUB_REPO = os.environ.get("GITHUB_REPO", "")  # format: owner/repo
 GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN", "")  # for creating releases
+GITHUB_ACTIONS = os.environ.get("GITHUB_ACTIONS")
+GITHUB_REPOSITORY = os.environ.get("GITHUB_REPOSITORY", "")
 
 # API endpoints
 PRINTFUL_API_BASE = "https://api.printful.com"
@@ -38,17 +49,85 @@ SHOPIFY_API_BASE = f"https://{SHOPIFY_STORE}.myshopify.com/admin/api/2024-01" if
 # Upload tracking file
 UPLOAD_TRACKER_FILE = "upload_tracker.json"
 
+# Bella + Canvas 3001 sizes as (size, Printful variant_id, has 2XL upcharge)
+SIZE_VARIANTS = (
+    ("S", 4012, False),
+    ("M", 4013, False),
+    ("L", 4014, False),
+    ("XL", 4015, False),
+    ("2XL", 4016, True),
+)
+SIZE_NAMES = [size for size, _, _ in SIZE_VARIANTS]
+UPCHARGE_2XL = 1.12
+
+# Console section separator
+SEPARATOR = "=" * 60
+
+def _create_session():
+    """Create a pooled HTTP session with retries for transient errors"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=32,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.5,
+            backoff_jitter=1.0,
+            status_forcelist=[500, 502, 503, 504]
+        )
+    )
+    session.mount("https://", adapter)
+    return session
+
+# Shared session so Shopify calls reuse connections across designs
+_SESSION = _create_session()
+
+def _json_body(payload):
+    """Request kwargs for a JSON body, pre-serialized with orjson when available"""
+    if orjson is not None:
+        return {"data": orjson.dumps(payload)}
+    return {"json": payload}
+
+def _response_json(response):
+    """Decode a JSON response body, using orjson when available"""
+    if orjson is not None:
+        return orjson.loads(response.content)
+    return response.json()
+
 class UploadManagerV2:
-    def __init__(self, upload_dir=".", dry_run=False):
+    def __init__(self, upload_dir=".", dry_run=False, workers=4):
         self.upload_dir = Path(upload_dir)
         self.dry_run = dry_run
+        self.workers = max(1, workers)
         self.tracker = self.load_tracker()
+        self.tracker_lock = threading.Lock()
         self.session = self.create_session()
         self.rate_limiter = RateLimiter()
+        # Shopify REST: leaky bucket of 40 calls draining at 2 per second
+        self.shopify_rate_limiter = RateLimiter(rate=2, per=1.0, capacity=40)
         
     def create_session(self):
         """Create session with proper headers for Printful API 2025"""
         session = requests.Session()
+        # One connection per worker thread, so uploads don't queue for a socket.
+        # 429s are retried here after Retry-After (or jittered backoff); Printful
+        # rejects rate-limited calls before doing any work, so POSTs are safe to resend.
+        # Read timeouts and dropped responses are not retried (read=0, other=0):
+        # the POST may already have created the product
+        session.mount("https://", HTTPAdapter(
+            pool_maxsize=max(10, self.workers),
+            max_retries=Retry(
+                total=5,
+                read=0,
+                other=0,
+                backoff_factor=0.5,
+                backoff_jitter=1.0,
+                status_forcelist=[429],
+                allowed_methods=None,
+                respect_retry_after_header=True,
+                raise_on_status=False
+            )
+        ))
         
         # Required headers for Printful API
         headers = {
@@ -70,15 +149,26 @@ class UploadManagerV2:
         
     def load_tracker(self):
         """Load upload tracking data"""
-        if os.path.exists(UPLOAD_TRACKER_FILE):
+        try:
             with open(UPLOAD_TRACKER_FILE, 'r') as f:
                 return json.load(f)
-        return {"uploaded": {}, "failed": {}, "stats": {"total_uploaded": 0, "total_failed": 0}}
+        except FileNotFoundError:
+            return {"uploaded": {}, "failed": {}, "stats": {"total_uploaded": 0, "total_failed": 0}}
     
     def save_tracker(self):
-        """Save upload tracking data"""
-        with open(UPLOAD_TRACKER_FILE, 'w') as f:
-            json.dump(self.tracker, f, indent=2)
+        """Save upload tracking data (written to a temp file and swapped in, so a crash never truncates it)"""
+        if orjson is not None:
+            data = orjson.dumps(self.tracker, option=orjson.OPT_INDENT_2)
+        else:
+            data = json.dumps(self.tracker, indent=2).encode('utf-8')
+        
+        tmp_file = f"{UPLOAD_TRACKER_FILE}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+            # The data must be on disk before the rename, or a power loss can leave an empty tracker
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, UPLOAD_TRACKER_FILE)
     
     def get_file_hash(self, filepath):
         """Generate hash of file for tracking"""
@@ -104,9 +194,9 @@ class UploadManagerV2:
     def get_public_url(self, filepath):
         """Get or create a public URL for the design file"""
         # Option 1: If running in GitHub Actions, use artifact URL
-        if os.environ.get("GITHUB_ACTIONS"):
+        if GITHUB_ACTIONS:
             # Files are available via GitHub's CDN during workflow
-            return f"https://raw.githubusercontent.com/{os.environ.get('GITHUB_REPOSITORY')}/main/{filepath.name}"
+            return f"https://raw.githubusercontent.com/{GITHUB_REPOSITORY}/main/{filepath.name}"
         
         # Option 2: Upload to a public hosting service
         # For this example, we'll assume files are hosted elsewhere
@@ -132,62 +222,24 @@ class UploadManagerV2:
             
             print("  📤 Creating Printful product...")
             
+            # Price strings are formatted once and every variant shares one files list
+            price = f"{design_info['retail_price']:.2f}"
+            price_2xl = f"{design_info['retail_price'] * UPCHARGE_2XL:.2f}"
+            files = [
+                {
+                    "type": "front_large",  # CRITICAL: Use "front_large" not "front"!
+                    "url": design_url
+                }
+            ]
+            
             # Product data following Printful API 2025 format
             product_data = {
                 "sync_product": {
                     "name": f"{design_info['category'].title()} - {design_info['theme'].title()}"
                 },
                 "sync_variants": [
-                    {
-                        "variant_id": 4012,  # Bella + Canvas 3001 - S
-                        "retail_price": f"{design_info['retail_price']:.2f}",
-                        "files": [
-                            {
-                                "type": "front_large",  # CRITICAL: Use "front_large" not "front"!
-                                "url": design_url
-                            }
-                        ]
-                    },
-                    {
-                        "variant_id": 4013,  # M
-                        "retail_price": f"{design_info['retail_price']:.2f}",
-                        "files": [
-                            {
-                                "type": "front_large",
-                                "url": design_url
-                            }
-                        ]
-                    },
-                    {
-                        "variant_id": 4014,  # L
-                        "retail_price": f"{design_info['retail_price']:.2f}",
-                        "files": [
-                            {
-                                "type": "front_large",
-                                "url": design_url
-                            }
-                        ]
-                    },
-                    {
-                        "variant_id": 4015,  # XL
-                        "retail_price": f"{design_info['retail_price']:.2f}",
-                        "files": [
-                            {
-                                "type": "front_large",
-                                "url": design_url
-                            }
-                        ]
-                    },
-                    {
-                        "variant_id": 4016,  # 2XL
-                        "retail_price": f"{design_info['retail_price'] * 1.12:.2f}",
-                        "files": [
-                            {
-                                "type": "front_large",
-                                "url": design_url
-                            }
-                        ]
-                    }
+                    {"variant_id": variant_id, "retail_price": price_2xl if upcharge else price, "files": files}
+                    for _, variant_id, upcharge in SIZE_VARIANTS
                 ]
             }
             
@@ -196,25 +248,18 @@ class UploadManagerV2:
             
             response = self.session.post(
                 url,
-                json=product_data,
+                **_json_body(product_data),
                 timeout=30
             )
             
             # Log response for debugging
             print(f"  Response status: {response.status_code}")
             
-            if response.status_code == 429:
-                # Rate limited
-                retry_after = int(response.headers.get('Retry-After', 60))
-                print(f"  ⏳ Rate limited. Waiting {retry_after} seconds...")
-                time.sleep(retry_after)
-                return self.create_printful_product(filepath, design_info)  # Retry
-            
             if response.status_code != 200:
                 print(f"  ❌ Printful error: {response.status_code} - {response.text[:200]}")
                 return None
             
-            result = response.json()
+            result = _response_json(response)
             product_id = result.get("result", {}).get("id")
             
             if product_id:
@@ -252,6 +297,10 @@ class UploadManagerV2:
             with open(filepath, 'rb') as f:
                 image_base64 = base64.b64encode(f.read()).decode('utf-8')
             
+            price = f"{design_info['retail_price']:.2f}"
+            price_2xl = f"{design_info['retail_price'] * UPCHARGE_2XL:.2f}"
+            sku_prefix = f"TEE-{design_info['file_hash'][:8]}"
+            
             product_data = {
                 "product": {
                     "title": f"{design_info['category'].title()} T-Shirt - {design_info['theme'].title()}",
@@ -267,35 +316,16 @@ class UploadManagerV2:
                     ],
                     "variants": [
                         {
-                            "option1": "S",
-                            "price": f"{design_info['retail_price']:.2f}",
-                            "sku": f"TEE-{design_info['file_hash'][:8]}-S"
-                        },
-                        {
-                            "option1": "M",
-                            "price": f"{design_info['retail_price']:.2f}",
-                            "sku": f"TEE-{design_info['file_hash'][:8]}-M"
-                        },
-                        {
-                            "option1": "L",
-                            "price": f"{design_info['retail_price']:.2f}",
-                            "sku": f"TEE-{design_info['file_hash'][:8]}-L"
-                        },
-                        {
-                            "option1": "XL",
-                            "price": f"{design_info['retail_price']:.2f}",
-                            "sku": f"TEE-{design_info['file_hash'][:8]}-XL"
-                        },
-                        {
-                            "option1": "2XL",
-                            "price": f"{design_info['retail_price'] * 1.12:.2f}",
-                            "sku": f"TEE-{design_info['file_hash'][:8]}-2XL"
+                            "option1": size,
+                            "price": price_2xl if upcharge else price,
+                            "sku": f"{sku_prefix}-{size}"
                         }
+                        for size, _, upcharge in SIZE_VARIANTS
                     ],
                     "options": [
                         {
                             "name": "Size",
-                            "values": ["S", "M", "L", "XL", "2XL"]
+                            "values": SIZE_NAMES
                         }
                     ]
                 }
@@ -313,13 +343,14 @@ class UploadManagerV2:
                 ]
             
             url = f"{SHOPIFY_API_BASE}/products.json"
-            response = requests.post(url, json=product_data, headers=headers, timeout=30)
+            self.shopify_rate_limiter.wait_if_needed()
+            response = _SESSION.post(url, headers=headers, timeout=30, **_json_body(product_data))
             
             if response.status_code != 201:
                 print(f"  ❌ Shopify error: {response.status_code} - {response.text[:200]}")
                 return None
                 
-            product = response.json()["product"]
+            product = _response_json(response)["product"]
             print(f"  ✅ Shopify product created: {product['title']}")
             
             return {
@@ -349,13 +380,14 @@ class UploadManagerV2:
         filename = os.path.basename(filepath)
         file_hash = self.get_file_hash(filepath)
         
-        print(f"\n{'='*60}")
-        print(f"📁 Processing: {filename}")
+        # Each header and its details go out in one print, so concurrent workers
+        # can't interleave lines from different files
+        header = f"\n{SEPARATOR}\n📁 Processing: {filename}"
         
         # Check if already uploaded
         if self.is_uploaded(filepath):
             upload_info = self.tracker["uploaded"][file_hash]
-            print(f"✅ Already uploaded on {upload_info['upload_date']}")
+            print(f"{header}\n✅ Already uploaded on {upload_info['upload_date']}")
             return False
         
         # Extract design information
@@ -375,9 +407,12 @@ class UploadManagerV2:
             "retail_price": retail_price
         }
         
-        print(f"📋 Category: {category}")
-        print(f"🎨 Theme: {theme}")
-        print(f"💰 Retail Price: ${retail_price:.2f} (markup: {MARKUP_PERCENT}x)")
+        print("\n".join([
+            header,
+            f"📋 Category: {category}",
+            f"🎨 Theme: {theme}",
+            f"💰 Retail Price: ${retail_price:.2f} (markup: {MARKUP_PERCENT}x)",
+        ]))
         
         if self.dry_run:
             print("🔍 DRY RUN - Would upload this file")
@@ -393,35 +428,47 @@ class UploadManagerV2:
         if SHOPIFY_STORE:
             shopify_result = self.create_shopify_product(filepath, design_info, printful_result)
         
-        # Track upload
+        # Track upload (files may be processed concurrently)
         if printful_result or shopify_result:
-            self.tracker["uploaded"][file_hash] = {
-                "filename": filename,
-                "upload_date": datetime.now().isoformat(),
-                "category": category,
-                "theme": theme,
-                "base_price": base_price,
-                "retail_price": retail_price,
-                **(printful_result or {}),
-                **(shopify_result or {})
-            }
-            self.tracker["stats"]["total_uploaded"] += 1
-            self.save_tracker()
+            with self.tracker_lock:
+                self.tracker["uploaded"][file_hash] = {
+                    "filename": filename,
+                    "upload_date": datetime.now().isoformat(),
+                    "category": category,
+                    "theme": theme,
+                    "base_price": base_price,
+                    "retail_price": retail_price,
+                    **(printful_result or {}),
+                    **(shopify_result or {})
+                }
+                self.tracker["stats"]["total_uploaded"] += 1
+                self.save_tracker()
             print("✅ Upload successful!")
             return True
         else:
-            self.tracker["failed"][file_hash] = {
-                "filename": filename,
-                "fail_date": datetime.now().isoformat(),
-                "category": category,
-                "theme": theme,
-                "error": "Failed to create product"
-            }
-            self.tracker["stats"]["total_failed"] += 1
-            self.save_tracker()
+            with self.tracker_lock:
+                self.tracker["failed"][file_hash] = {
+                    "filename": filename,
+                    "fail_date": datetime.now().isoformat(),
+                    "category": category,
+                    "theme": theme,
+                    "error": "Failed to create product"
+                }
+                self.tracker["stats"]["total_failed"] += 1
+                self.save_tracker()
             print("❌ Upload failed!")
             return False
     
+    def process_path(self, filepath):
+        """Process one file from a directory scan, returning its outcome"""
+        try:
+            if self.is_uploaded(filepath):
+                return "skipped"
+            return "uploaded" if self.process_file(filepath) else "failed"
+        except Exception as e:
+            print(f"Error processing {filepath}: {str(e)}")
+            return "failed"
+    
     def process_directory(self):
         """Process all PNG files in the upload directory"""
         png_files = list(self.upload_dir.glob("design_*.png"))
@@ -432,26 +479,17 @@ class UploadManagerV2:
         
         print(f"Found {len(png_files)} design files")
         
-        uploaded = 0
-        skipped = 0
-        failed = 0
-        
-        for filepath in png_files:
-            try:
-                if self.is_uploaded(filepath):
-                    skipped += 1
-                elif self.process_file(filepath):
-                    uploaded += 1
-                else:
-                    failed += 1
-            except Exception as e:
-                print(f"Error processing {filepath}: {str(e)}")
-                failed += 1
+        # Uploads are network-bound, so process several files at once;
+        # the shared rate limiter keeps the overall request rate in check
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            outcomes = list(executor.map(self.process_path, png_files))
+        
+        uploaded = outcomes.count("uploaded")
+        skipped = outcomes.count("skipped")
+        failed = outcomes.count("failed")
         
         # Summary
-        print(f"\n{'='*60}")
-        print("📊 UPLOAD SUMMARY")
-        print(f"{'='*60}")
+        print(f"\n{SEPARATOR}\n📊 UPLOAD SUMMARY\n{SEPARATOR}")
         print(f"✅ Uploaded: {uploaded}")
         print(f"⏭️  Skipped: {skipped}")
         print(f"❌ Failed: {failed}")
@@ -459,32 +497,39 @@ class UploadManagerV2:
         print(f"\n💾 Total all-time uploads: {self.tracker['stats']['total_uploaded']}")
 
 class RateLimiter:
-    """Handle Printful API rate limiting (120 requests/minute)"""
-    def __init__(self):
-        self.requests = []
-        self.max_requests = 120
-        self.window = 60  # seconds
+    """Token bucket for API rate limits (Printful: 120 requests/minute)
+    
+    Requests spend a token and only sleep when the bucket is empty, so
+    bursts up to `capacity` go out immediately while the long-run rate stays
+    at `rate` per `per` seconds.
+    """
+    def __init__(self, rate=120, per=60.0, capacity=10):
+        self.refill_rate = rate / per  # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
         
     def wait_if_needed(self):
-        """Wait if necessary to respect rate limits"""
-        now = time.time()
-        
-        # Remove old requests outside the window
-        self.requests = [req_time for req_time in self.requests if now - req_time < self.window]
-        
-        # If at limit, wait
-        if len(self.requests) >= self.max_requests:
-            sleep_time = self.window - (now - self.requests[0]) + 1
-            print(f"  ⏳ Rate limit reached. Waiting {sleep_time:.1f} seconds...")
-            time.sleep(sleep_time)
+        """Wait if necessary to respect rate limits (shared by worker threads)"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+            self.updated = now
             
-        # Add current request
-        self.requests.append(now)
-        
-        # Also add a small delay between requests
-        time.sleep(0.5)
+            # If the bucket is empty, wait for the next token
+            if self.tokens < 1:
+                sleep_time = (1 - self.tokens) / self.refill_rate
+                print(f"  ⏳ Rate limit reached. Waiting {sleep_time:.1f} seconds...")
+                time.sleep(sleep_time)
+                self.tokens = 1
+                self.updated = time.monotonic()
+            
+            self.tokens -= 1
 
 def main():
+    global PRINTFUL_API_KEY
+    
     parser = argparse.ArgumentParser(
         description='Upload t-shirt designs to Printful and Shopify (2025 API)',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -510,6 +555,7 @@ Examples:
     parser.add_argument('--reset-tracker', action='store_true', help='Reset upload tracker')
     parser.add_argument('--shopify-only', action='store_true', help='Skip Printful, only upload to Shopify')
     parser.add_argument('--check-auth', action='store_true', help='Test API authentication')
+    parser.add_argument('--workers', type=int, default=4, help='Number of files to upload in parallel (default: 4)')
     
     args = parser.parse_args()
     
@@ -523,14 +569,14 @@ Examples:
             response = manager.session.get(f"{PRINTFUL_API_BASE}/oauth/scopes")
             if response.status_code == 200:
                 print("✅ Printful authentication successful")
-                print(f"   Scopes: {response.json()}")
+                print(f"   Scopes: {_response_json(response)}")
             else:
                 print(f"❌ Printful authentication failed: {response.status_code}")
         
         # Test Shopify
         if SHOPIFY_ACCESS_TOKEN:
             headers = {"X-Shopify-Access-Token": SHOPIFY_ACCESS_TOKEN}
-            response = requests.get(f"{SHOPIFY_API_BASE}/shop.json", headers=headers)
+            response = _SESSION.get(f"{SHOPIFY_API_BASE}/shop.json", headers=headers)
             if response.status_code == 200:
                 print("✅ Shopify authentication successful")
             else:
@@ -540,7 +586,8 @@ Examples:
     
     # Skip Printful if requested
     if args.shopify_only:
-        os.environ['PRINTFUL_API_KEY'] = ''
+        # Settings are read once at import, so clear the module value, not os.environ
+        PRINTFUL_API_KEY = ''
         print("📝 Shopify-only mode enabled")
     
     # Reset tracker if requested
@@ -552,7 +599,7 @@ Examples:
         return
     
     # Create upload manager
-    manager = UploadManagerV2(upload_dir=args.dir, dry_run=args.dry_run)
+    manager = UploadManagerV2(upload_dir=args.dir, dry_run=args.dry_run, workers=args.workers)
     
     # Process files
     if args.file: